@@ -6,6 +6,7 @@ import (
 	"fmt"
 	"os"
 	"os/signal"
+	"strings"
 	"syscall"
 
 	"github.com/zetmem/mcp-server/pkg/config"
@@ -25,6 +26,7 @@ func main() {
 		configPath = flag.String("config", "", "Path to configuration file")
 		envFile    = flag.String("env", ".env", "Path to environment file")
 		logLevel   = flag.String("log-level", "info", "Log level (debug, info, warn, error)")
+		transport  = flag.String("transport", "stdio", "MCP transport (stdio, unix:<socket path>)")
 	)
 	flag.Parse()
 
@@ -148,9 +150,18 @@ func main() {
 	}()
 
 	// Start MCP server
-	logger.Info("Starting MCP server...")
-	if err := mcpServer.Start(ctx); err != nil && err != context.Canceled {
-		logger.Fatal("MCP server failed", zap.Error(err))
+	logger.Info("Starting MCP server...", zap.String("transport", *transport))
+	var serveErr error
+	switch {
+	case *transport == "stdio":
+		serveErr = mcpServer.Start(ctx)
+	case strings.HasPrefix(*transport, "unix:"):
+		serveErr = mcpServer.ServeUnix(ctx, strings.TrimPrefix(*transport, "unix:"))
+	default:
+		logger.Fatal("Unknown transport", zap.String("transport", *transport))
+	}
+	if serveErr != nil && serveErr != context.Canceled {
+		logger.Fatal("MCP server failed", zap.Error(serveErr))
 	}
 
 	logger.Info("ZetMem MCP Server shutdown complete")
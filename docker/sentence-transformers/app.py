@@ -4,59 +4,588 @@ Simple FastAPI service for sentence-transformers embeddings
 """
 
 import os
+
+# Pin BLAS/OpenMP thread pools before numpy or torch are imported; the
+# defaults use every core and oversubscribe the host under several workers
+NUM_THREADS = os.environ.setdefault("OMP_NUM_THREADS", "4")
+os.environ.setdefault("MKL_NUM_THREADS", NUM_THREADS)
+os.environ.setdefault("OPENBLAS_NUM_THREADS", NUM_THREADS)
+
+import copy
+import asyncio
+import hashlib
 import logging
-from typing import List, Dict, Any
+import time
+from typing import List, Dict, Any, NamedTuple, Optional, Tuple
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import ORJSONResponse, StreamingResponse
 import numpy as np
+import orjson
+from cachetools import LRUCache
 from sentence_transformers import SentenceTransformer
+import torch
+
+torch.set_num_threads(int(NUM_THREADS))
+try:
+    torch.set_num_interop_threads(1)
+except RuntimeError:
+    # `python app.py` imports this module again as "app" for uvicorn, and
+    # torch only accepts the interop thread count once per process
+    pass
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Global model instance
-model = None
+# Loaded models, most recently used last; the default model is never evicted
+DEFAULT_MODEL = os.getenv("MODEL_NAME", "all-MiniLM-L6-v2")
+MODEL_CACHE_SIZE = int(os.getenv("MODEL_CACHE_SIZE", "3"))
+MODEL_CACHE: "OrderedDict[str, SentenceTransformer]" = OrderedDict()
+model_loads: Dict[str, asyncio.Future] = {}
+
+# Precision each loaded model actually runs at, once the drift check has run;
+# "auto" resolves differently per device, so embeddings are keyed on this
+model_precision: Dict[str, str] = {}
+
+# Comma-separated models request.model may name besides the default; when
+# unset, only the default model is served
+ALLOWED_MODELS = {name.strip() for name in os.getenv("ALLOWED_MODELS", "").split(",") if name.strip()}
+
+# A model that failed to load is not retried for this many seconds
+MODEL_RETRY_SECONDS = float(os.getenv("MODEL_RETRY_SECONDS", "300"))
+model_failures: Dict[str, tuple] = {}
+
+# Embedding cache keyed on a content hash; Redis is shared across workers
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "100000"))
+REDIS_URL = os.getenv("REDIS_URL")
+REDIS_KEY_PREFIX = b"zetmem:embedding:"
+# Redis is shared with zetmem-server, so cached embeddings expire (seconds)
+EMBEDDING_CACHE_TTL = int(os.getenv("EMBEDDING_CACHE_TTL", str(7 * 24 * 3600)))
+embedding_cache = LRUCache(maxsize=EMBEDDING_CACHE_SIZE)
+redis_client = None
+
+# After a Redis error the cache runs local-only for this many seconds, so an
+# outage does not add a socket timeout and a warning to every request
+REDIS_RETRY_SECONDS = float(os.getenv("REDIS_RETRY_SECONDS", "30"))
+redis_retry_at = 0.0
+
+# Mini-batch size for encoding; tune independently for CPU and GPU deployments
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "32"))
+
+# Sentence cap for /embeddings/stream, whose whole request body is still
+# parsed and tokenized up front
+STREAM_MAX_SENTENCES = int(os.getenv("STREAM_MAX_SENTENCES", "10000"))
+
+# Dynamic batching: concurrent requests arriving within the wait window are
+# encoded together, up to COALESCE_MAX_BATCH sentences per pass
+COALESCE_MAX_BATCH = int(os.getenv("COALESCE_MAX_BATCH", "64"))
+COALESCE_MAX_WAIT_MS = float(os.getenv("COALESCE_MAX_WAIT_MS", "5"))
+encode_queue = None
+
+# Encodes run on a dedicated pool rather than the default executor that also
+# serves request handling; one thread serializes kernel launches per device
+ENCODE_THREADS = int(os.getenv("ENCODE_THREADS", "1"))
+encode_pool = None
+
+# When one worker sees several GPUs, large batches for the default model are
+# spread across them with a sentence-transformers multi-process pool. It needs
+# the torch backend and a single worker (WORKERS, exported by both launchers),
+# i.e. MODEL_BACKEND=torch WORKERS=1 with either the image's gunicorn command
+# or `python app.py`; the shipped config (onnx, one worker per GPU) never starts it
+MULTI_PROCESS_MIN_BATCH = int(os.getenv("MULTI_PROCESS_MIN_BATCH", "64"))
+multi_process_pool = None
+
+# Inference backend: "onnx" (ONNX Runtime) or "torch"
+MODEL_BACKEND = os.getenv("MODEL_BACKEND", "onnx")
+
+# Directory holding pre-optimized ONNX exports baked into the image
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", "/app/models")
+ONNX_OPTIMIZATION_LEVEL = os.getenv("ONNX_OPTIMIZATION_LEVEL", "O3")
+ONNX_QUANTIZATION_CONFIG = os.getenv("ONNX_QUANTIZATION_CONFIG", "avx512_vnni")
+
+# Weight precision: "auto" (int8 on CPU, fp16 on CUDA), "int8", "fp16" or "fp32"
+QUANTIZATION = os.getenv("QUANTIZATION", "auto")
+QUANTIZATION_MODES = ("auto", "int8", "fp16", "fp32")
+if QUANTIZATION not in QUANTIZATION_MODES:
+    raise ValueError(f"Unknown QUANTIZATION {QUANTIZATION!r}, expected one of {', '.join(QUANTIZATION_MODES)}")
+
+# Maximum cosine distance from FP32 tolerated before falling back to FP32
+QUANTIZATION_MAX_DRIFT = float(os.getenv("QUANTIZATION_MAX_DRIFT", "1e-3"))
 
-class EmbeddingRequest(BaseModel):
+# Held-out sentences used to validate quantized embeddings at startup
+DRIFT_SENTENCES = [
+    "function fibonacci(n) { return n <= 1 ? n : fibonacci(n-1) + fibonacci(n-2); }",
+    "Retry failed HTTP requests with exponential backoff",
+    "SELECT id, name FROM users WHERE active = true ORDER BY created_at DESC",
+    "Use a context manager to make sure the file handle is closed",
+    "def merge_sort(items): return items if len(items) < 2 else merge(*split(items))",
+    "The cache is invalidated whenever the configuration file changes",
+]
+
+class EmbeddingRequest(NamedTuple):
     sentences: List[str]
-    model: str = None
+    model: Optional[str] = None
 
-class EmbeddingResponse(BaseModel):
-    embeddings: List[List[float]]
+# Request bodies are parsed by hand on the hot path; this keeps the schema in
+# the OpenAPI docs without paying for Pydantic validation on every call
+EMBEDDING_REQUEST_SCHEMA = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "application/json": {
+                "schema": {
+                    "type": "object",
+                    "required": ["sentences"],
+                    "properties": {
+                        "sentences": {"type": "array", "items": {"type": "string"}},
+                        "model": {"type": "string"}
+                    }
+                }
+            }
+        }
+    }
+}
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    # Startup
-    global model
-    model_name = os.getenv("MODEL_NAME", "all-MiniLM-L6-v2")
+async def parse_embedding_request(request: Request) -> EmbeddingRequest:
+    """Parse an embedding request body with orjson and check its shape"""
+    try:
+        payload = orjson.loads(await request.body())
+    except orjson.JSONDecodeError:
+        raise HTTPException(status_code=422, detail="Request body is not valid JSON")
+
+    if not isinstance(payload, dict):
+        raise HTTPException(status_code=422, detail="Request body must be a JSON object")
+
+    sentences = payload.get("sentences")
+    if not isinstance(sentences, list) or not all(isinstance(s, str) for s in sentences):
+        raise HTTPException(status_code=422, detail="'sentences' must be a list of strings")
+
+    model = payload.get("model")
+    if model is not None and not isinstance(model, str):
+        raise HTTPException(status_code=422, detail="'model' must be a string")
+
+    return EmbeddingRequest(sentences=sentences, model=model)
+
+def token_lengths(model: SentenceTransformer, sentences: List[str]) -> List[int]:
+    """Token length of each sentence"""
+    return [len(model.tokenizer.tokenize(s)) for s in sentences]
+
+def encode_sentences(model: SentenceTransformer, sentences: List[str],
+                     lengths: Optional[List[Optional[int]]] = None) -> np.ndarray:
+    """Encode sentences in length-homogeneous mini-batches to minimise padding
+
+    lengths may carry token lengths the caller already knows; only sentences
+    whose entry is None (or all of them, if lengths is None) are tokenized.
+    """
+    if (multi_process_pool is not None and len(sentences) >= MULTI_PROCESS_MIN_BATCH
+            and model is MODEL_CACHE.get(DEFAULT_MODEL)):
+        return model.encode_multi_process(sentences, multi_process_pool, batch_size=MAX_BATCH_SIZE)
+
+    # Sort by token length so each mini-batch pads to a similar length
+    lengths = list(lengths) if lengths is not None else [None] * len(sentences)
+    unknown = [i for i, length in enumerate(lengths) if length is None]
+    for i, length in zip(unknown, token_lengths(model, [sentences[i] for i in unknown])):
+        lengths[i] = length
+    order = np.argsort(lengths, kind="stable")
+    sorted_sentences = [sentences[i] for i in order]
+
+    batches = []
+    for start in range(0, len(sorted_sentences), MAX_BATCH_SIZE):
+        chunk = sorted_sentences[start:start + MAX_BATCH_SIZE]
+        batches.append(model.encode(
+            chunk,
+            batch_size=len(chunk),
+            convert_to_numpy=True,
+            show_progress_bar=False
+        ))
+    embeddings = np.vstack(batches)
+
+    # Scatter back to the original request order
+    inv = np.argsort(order)
+    return embeddings[inv]
+
+async def encode_batcher():
+    """Coalesce queued encode requests into shared forward passes"""
+    while True:
+        batch = [await encode_queue.get()]
+        total = len(batch[0][1])
+
+        # Give concurrent callers a brief window to join this batch
+        if total < COALESCE_MAX_BATCH and encode_queue.empty() and COALESCE_MAX_WAIT_MS > 0:
+            await asyncio.sleep(COALESCE_MAX_WAIT_MS / 1000)
+        while total < COALESCE_MAX_BATCH and not encode_queue.empty():
+            item = encode_queue.get_nowait()
+            batch.append(item)
+            total += len(item[1])
+
+        # Skip callers that gave up while waiting, then group by model
+        groups: Dict[int, list] = {}
+        for model, sentences, lengths, future in batch:
+            if not future.done():
+                groups.setdefault(id(model), []).append((model, sentences, lengths, future))
+
+        await asyncio.gather(*[encode_group(group) for group in groups.values()])
+
+async def encode_group(group: list):
+    """Encode one model's share of a batch on the encode pool"""
+    model = group[0][0]
+    sentences = [s for _, item_sentences, _, _ in group for s in item_sentences]
+    lengths = [
+        length
+        for _, item_sentences, item_lengths, _ in group
+        for length in (item_lengths if item_lengths is not None else [None] * len(item_sentences))
+    ]
+    try:
+        embeddings = await asyncio.get_running_loop().run_in_executor(
+            encode_pool, encode_sentences, model, sentences, lengths
+        )
+    except Exception as e:
+        for _, _, _, future in group:
+            if not future.done():
+                future.set_exception(e)
+        return
+
+    # Split the combined result back out to each caller
+    offset = 0
+    for _, item_sentences, _, future in group:
+        if not future.done():
+            future.set_result(embeddings[offset:offset + len(item_sentences)])
+        offset += len(item_sentences)
+
+async def encode_coalesced(model: SentenceTransformer, sentences: List[str],
+                           lengths: Optional[List[int]] = None) -> np.ndarray:
+    """Queue sentences (and any known token lengths) for the batcher and wait for their embeddings"""
+    future = asyncio.get_running_loop().create_future()
+    await encode_queue.put((model, sentences, lengths, future))
+    return await future
+
+def cache_key(model_name: str, sentence: str) -> bytes:
+    """Hash a sentence together with the model, backend and loaded precision"""
+    key = f"{MODEL_BACKEND}\0{model_precision[model_name]}\0{model_name}\0{sentence}"
+    return hashlib.blake2b(key.encode(), digest_size=16).digest()
+
+def redis_available() -> bool:
+    """Report whether Redis is configured and not in its post-failure backoff"""
+    return redis_client is not None and time.monotonic() >= redis_retry_at
+
+def redis_failed(operation: str, error: Exception):
+    """Skip Redis for REDIS_RETRY_SECONDS after a failed operation"""
+    global redis_retry_at
+    redis_retry_at = time.monotonic() + REDIS_RETRY_SECONDS
+    logger.warning(f"Redis embedding cache {operation} failed, skipping Redis for {REDIS_RETRY_SECONDS:g}s: {error}")
+
+async def fetch_cached(keys: List[bytes]) -> List[Optional[np.ndarray]]:
+    """Look up embeddings in the local LRU, then in Redis for the misses"""
+    found = [embedding_cache.get(key) for key in keys]
+    missing = [i for i, vector in enumerate(found) if vector is None]
+    if not missing or not redis_available():
+        return found
+
+    try:
+        values = await redis_client.mget([REDIS_KEY_PREFIX + keys[i] for i in missing])
+    except Exception as e:
+        redis_failed("lookup", e)
+        return found
+
+    for i, value in zip(missing, values):
+        if value is not None:
+            found[i] = np.frombuffer(value, dtype=np.float16).astype(np.float32)
+            embedding_cache[keys[i]] = found[i]
+    return found
+
+async def store_cached(keys: List[bytes], embeddings: np.ndarray):
+    """Write freshly computed embeddings to the local LRU and Redis"""
+    for key, vector in zip(keys, embeddings):
+        # Copy so a cached row does not pin the whole batch array in memory
+        embedding_cache[key] = vector.copy()
+
+    if not redis_available():
+        return
+    try:
+        # MSET cannot expire keys, so pipeline one SET ... EX per embedding
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for key, vector in zip(keys, embeddings):
+                pipe.set(REDIS_KEY_PREFIX + key, vector.astype(np.float16).tobytes(), ex=EMBEDDING_CACHE_TTL)
+            await pipe.execute()
+    except Exception as e:
+        redis_failed("store", e)
+
+async def get_embeddings(model_name: str, sentences: List[str],
+                         lengths: Optional[List[int]] = None) -> np.ndarray:
+    """Return embeddings, only encoding sentences that are not cached"""
+    # Handle each distinct sentence once, then scatter back to the duplicates
+    unique, first, inverse = np.unique(
+        np.array(sentences, dtype=object), return_index=True, return_inverse=True
+    )
+    sentences = list(unique)
+    if lengths is not None:
+        lengths = [lengths[i] for i in first]
+
+    # The model must be loaded to know the precision its cache keys use
+    model = await get_model(model_name)
+    keys = [cache_key(model_name, s) for s in sentences]
+    found = await fetch_cached(keys)
+
+    missing_idx = [i for i, vector in enumerate(found) if vector is None]
+    if missing_idx:
+        encoded = await encode_coalesced(
+            model,
+            [sentences[i] for i in missing_idx],
+            None if lengths is None else [lengths[i] for i in missing_idx]
+        )
+        await store_cached([keys[i] for i in missing_idx], encoded)
+        for i, vector in zip(missing_idx, encoded):
+            found[i] = vector
+
+    return np.stack(found)[inverse.reshape(-1)]
+
+def onnx_provider() -> str:
+    """Pick the ONNX Runtime execution provider for this host"""
+    import onnxruntime
+
+    if "CUDAExecutionProvider" in onnxruntime.get_available_providers():
+        return "CUDAExecutionProvider"
+    return "CPUExecutionProvider"
+
+def load_onnx_model(model_name: str, file_name: str = None) -> SentenceTransformer:
+    """Load an ONNX model, preferring the graph baked into the image"""
+    import onnxruntime
+
+    # ONNX Runtime has its own thread pool that ignores OMP_NUM_THREADS
+    session_options = onnxruntime.SessionOptions()
+    session_options.intra_op_num_threads = int(NUM_THREADS)
+    session_options.inter_op_num_threads = 1
+    model_kwargs = {"provider": onnx_provider(), "session_options": session_options}
+
+    # Prefer the graph optimized at image build time; otherwise export on the fly
+    baked_path = os.path.join(ONNX_MODEL_DIR, model_name)
+    file_name = file_name or os.path.join("onnx", f"model_{ONNX_OPTIMIZATION_LEVEL}.onnx")
+    if os.path.isfile(os.path.join(baked_path, file_name)):
+        model_name = baked_path
+        model_kwargs["file_name"] = file_name
+
+    return SentenceTransformer(model_name, backend="onnx", model_kwargs=model_kwargs)
+
+def is_cuda(model: SentenceTransformer) -> bool:
+    """Report whether the model runs on a CUDA device"""
+    if MODEL_BACKEND == "onnx":
+        return onnx_provider() == "CUDAExecutionProvider"
+    return model.device.type == "cuda"
+
+def quantize_model(model: SentenceTransformer, model_name: str, mode: str) -> Optional[SentenceTransformer]:
+    """Return a reduced-precision copy of the model, or None if unsupported"""
+    if MODEL_BACKEND == "onnx":
+        if mode != "int8":
+            logger.warning(f"Quantization {mode} is not supported by the ONNX backend")
+            return None
+        quantized_file = os.path.join("onnx", f"model_qint8_{ONNX_QUANTIZATION_CONFIG}.onnx")
+        if not os.path.isfile(os.path.join(ONNX_MODEL_DIR, model_name, quantized_file)):
+            logger.warning(f"No int8 ONNX export found for {model_name}")
+            return None
+        return load_onnx_model(model_name, quantized_file)
+
+    if mode == "int8" and is_cuda(model):
+        logger.warning("Dynamic int8 quantization is only supported on CPU")
+        return None
+
+    quantized = copy.deepcopy(model)
+    if mode == "fp16":
+        if not is_cuda(model):
+            logger.warning("FP16 quantization requires a CUDA device")
+            return None
+        return quantized.half()
+
+    # Dynamic int8 quantization of the Linear layers (CPU only)
+    transformer = quantized[0]
+    transformer.auto_model = torch.quantization.quantize_dynamic(
+        transformer.auto_model, {torch.nn.Linear}, dtype=torch.qint8
+    )
+    return quantized
+
+def embedding_drift(reference: SentenceTransformer, candidate: SentenceTransformer) -> float:
+    """Worst-case cosine distance between two models on the held-out sentences"""
+    expected = reference.encode(DRIFT_SENTENCES, convert_to_numpy=True, normalize_embeddings=True)
+    actual = candidate.encode(DRIFT_SENTENCES, convert_to_numpy=True, normalize_embeddings=True)
+    return float(np.max(1.0 - np.sum(expected * actual.astype(np.float32), axis=1)))
+
+def ensure_fast_tokenizer(model: SentenceTransformer):
+    """Swap in the Rust-backed tokenizer if a slow Python one was loaded"""
+    if getattr(model.tokenizer, "is_fast", False):
+        return
+
+    from transformers import AutoTokenizer
+
+    name_or_path = model.tokenizer.name_or_path
+    logger.warning(f"Slow tokenizer loaded for {name_or_path}, switching to the fast tokenizer")
+    tokenizer = AutoTokenizer.from_pretrained(name_or_path, use_fast=True)
+    if not tokenizer.is_fast:
+        logger.warning(f"No fast tokenizer available for {name_or_path}")
+        return
+    model.tokenizer = tokenizer
+
+def start_multi_process_pool(model: SentenceTransformer):
+    """Start one encode process per visible GPU when there is more than one"""
+    if MODEL_BACKEND == "onnx":
+        return None
+
+    # Every worker would otherwise start its own pool across the same GPUs
+    if int(os.getenv("WORKERS", "1")) != 1:
+        return None
+
+    if torch.cuda.device_count() < 2:
+        return None
+
+    device = model.device
+    pool = model.start_multi_process_pool()
+    # Starting the pool moves the model to CPU; small batches still run here
+    model.to(device)
+    logger.info(f"Started multi-process encode pool on {torch.cuda.device_count()} GPUs")
+    return pool
+
+def warm_up(model: SentenceTransformer):
+    """Run throwaway encodes so live requests skip lazy init and kernel compilation"""
+    model.encode(["warmup"] * 8, batch_size=8, convert_to_numpy=True, show_progress_bar=False)
+
+    # A full-length sequence triggers the kernels used for the longest inputs
+    max_seq_length = getattr(model, "max_seq_length", None) or 128
+    model.encode([" ".join(["warmup"] * max_seq_length)], convert_to_numpy=True, show_progress_bar=False)
+
+    if MODEL_BACKEND != "onnx" and is_cuda(model):
+        torch.cuda.synchronize()
+
+def load_model(model_name: str) -> SentenceTransformer:
+    """Load and warm up a model; it only becomes visible to /health afterwards"""
+    model, precision = load_precision_model(model_name)
+    model_precision[model_name] = precision
+    warm_up(model)
+    return model
+
+def load_precision_model(model_name: str) -> Tuple[SentenceTransformer, str]:
+    """Load a SentenceTransformer and the precision it ended up running at"""
+    if MODEL_BACKEND == "onnx":
+        logger.info(f"Using ONNX Runtime backend with {onnx_provider()}")
+        model = load_onnx_model(model_name)
+    else:
+        # Load on CPU first, then move the weights to the GPU if there is one
+        model = SentenceTransformer(model_name, device="cpu")
+        if torch.cuda.is_available():
+            model = model.to("cuda")
+
+    ensure_fast_tokenizer(model)
+
+    mode = QUANTIZATION
+    if mode == "auto":
+        mode = "fp16" if is_cuda(model) else "int8"
+    if mode == "fp32":
+        return model, "fp32"
+
+    quantized = quantize_model(model, model_name, mode)
+    if quantized is None:
+        return model, "fp32"
+
+    # Only keep the quantized model if it stays close to the FP32 embeddings
+    drift = embedding_drift(model, quantized)
+    if drift > QUANTIZATION_MAX_DRIFT:
+        logger.warning(f"{mode} drift {drift:.2e} exceeds {QUANTIZATION_MAX_DRIFT:.0e}, keeping fp32")
+        return model, "fp32"
+
+    logger.info(f"Using {mode} quantized model (cosine drift {drift:.2e})")
+    return quantized, mode
+
+async def get_model(model_name: str) -> SentenceTransformer:
+    """Return a cached model, loading it (once) and evicting the LRU on a miss"""
+    if model_name in MODEL_CACHE:
+        MODEL_CACHE.move_to_end(model_name)
+        return MODEL_CACHE[model_name]
+
+    failure = model_failures.get(model_name)
+    if failure is not None and time.monotonic() - failure[0] < MODEL_RETRY_SECONDS:
+        raise RuntimeError(f"Model {model_name} failed to load recently: {failure[1]}")
+
+    # Concurrent requests for the same new model share a single load, which
+    # is forgotten once it finishes; later requests hit the cache instead
+    load = model_loads.get(model_name)
+    if load is None:
+        load = asyncio.ensure_future(load_and_cache_model(model_name))
+        model_loads[model_name] = load
+        load.add_done_callback(lambda _: model_loads.pop(model_name, None))
+
+    # A caller that disconnects must not cancel the load for everyone else
+    return await asyncio.shield(load)
+
+async def load_and_cache_model(model_name: str) -> SentenceTransformer:
+    """Load a model off the event loop, then evict the LRU to make room"""
     logger.info(f"Loading model: {model_name}")
-    
     try:
-        model = SentenceTransformer(model_name)
-        logger.info(f"Model loaded successfully: {model_name}")
+        model = await asyncio.to_thread(load_model, model_name)
     except Exception as e:
-        logger.error(f"Failed to load model: {e}")
+        logger.error(f"Failed to load model {model_name}: {e}")
+        model_failures[model_name] = (time.monotonic(), str(e))
         raise
+    model_failures.pop(model_name, None)
+    MODEL_CACHE[model_name] = model
+
+    while len(MODEL_CACHE) > max(MODEL_CACHE_SIZE, 1):
+        evictable = [name for name in MODEL_CACHE if name != DEFAULT_MODEL]
+        if not evictable:
+            break
+        logger.info(f"Evicting model: {evictable[0]}")
+        del MODEL_CACHE[evictable[0]]
+    return model
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Startup
+    global redis_client, encode_queue, encode_pool, multi_process_pool
+
+    if REDIS_URL:
+        import redis.asyncio as redis
+
+        redis_client = redis.from_url(REDIS_URL, socket_connect_timeout=1, socket_timeout=1)
+        logger.info(f"Using Redis embedding cache at {REDIS_URL}")
+
+    # The gunicorn master may already have loaded the model before forking
+    if DEFAULT_MODEL not in MODEL_CACHE:
+        logger.info(f"Loading model: {DEFAULT_MODEL}")
+        try:
+            MODEL_CACHE[DEFAULT_MODEL] = load_model(DEFAULT_MODEL)
+            logger.info(f"Model loaded successfully: {DEFAULT_MODEL}")
+        except Exception as e:
+            logger.error(f"Failed to load model: {e}")
+            raise
+
+    multi_process_pool = start_multi_process_pool(MODEL_CACHE[DEFAULT_MODEL])
+    encode_pool = ThreadPoolExecutor(max_workers=ENCODE_THREADS, thread_name_prefix="encode")
+    encode_queue = asyncio.Queue()
+    batcher_task = asyncio.create_task(encode_batcher())
     
     yield
     
     # Shutdown
     logger.info("Shutting down embedding service")
+    batcher_task.cancel()
+    encode_pool.shutdown(wait=False)
+    if multi_process_pool is not None:
+        MODEL_CACHE[DEFAULT_MODEL].stop_multi_process_pool(multi_process_pool)
+    if redis_client is not None:
+        await redis_client.close()
 
 app = FastAPI(
     title="Sentence Transformers Embedding Service",
     description="Simple embedding service using sentence-transformers",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    if model is None:
+    if DEFAULT_MODEL not in MODEL_CACHE:
         raise HTTPException(status_code=503, detail="Model not loaded")
     return {"status": "healthy", "model_loaded": True}
 
@@ -66,56 +595,141 @@ async def root():
     return {
         "service": "sentence-transformers-embedding",
         "version": "1.0.0",
-        "model": os.getenv("MODEL_NAME", "all-MiniLM-L6-v2"),
+        "model": DEFAULT_MODEL,
         "status": "running"
     }
 
-@app.post("/embeddings", response_model=EmbeddingResponse)
-async def generate_embeddings(request: EmbeddingRequest):
-    """Generate embeddings for the given sentences"""
-    if model is None:
+def validate_request(request: EmbeddingRequest, max_sentences: int = 100) -> str:
+    """Validate an embedding request and return the model name to use"""
+    if DEFAULT_MODEL not in MODEL_CACHE:
         raise HTTPException(status_code=503, detail="Model not loaded")
+
+    model_name = request.model or DEFAULT_MODEL
+    if model_name != DEFAULT_MODEL and model_name not in ALLOWED_MODELS:
+        raise HTTPException(status_code=400, detail=f"Model not allowed: {model_name}")
     
     if not request.sentences:
         raise HTTPException(status_code=400, detail="No sentences provided")
     
-    if len(request.sentences) > 100:
-        raise HTTPException(status_code=400, detail="Too many sentences (max 100)")
+    if len(request.sentences) > max_sentences:
+        raise HTTPException(status_code=400, detail=f"Too many sentences (max {max_sentences})")
+
+    return model_name
+
+async def embed_request(request: EmbeddingRequest) -> np.ndarray:
+    """Validate an embedding request and return its embeddings as float32"""
+    model_name = validate_request(request)
     
     try:
         logger.info(f"Generating embeddings for {len(request.sentences)} sentences")
         
         # Generate embeddings
-        embeddings = model.encode(
-            request.sentences,
-            convert_to_numpy=True,
-            show_progress_bar=False
-        )
-        
-        # Convert to list of lists
-        embeddings_list = embeddings.tolist()
+        embeddings = await get_embeddings(model_name, request.sentences)
         
         logger.info(f"Generated embeddings with shape: {embeddings.shape}")
         
-        return EmbeddingResponse(embeddings=embeddings_list)
+        # orjson only serializes C-contiguous arrays
+        return np.ascontiguousarray(embeddings, dtype=np.float32)
         
     except Exception as e:
         logger.error(f"Error generating embeddings: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to generate embeddings: {str(e)}")
 
+@app.post("/embeddings", openapi_extra=EMBEDDING_REQUEST_SCHEMA)
+async def generate_embeddings(request: Request):
+    """Generate embeddings for the given sentences"""
+    # Returning the response directly skips jsonable_encoder, so orjson
+    # serializes the numpy array natively without tolist()
+    embeddings = await embed_request(await parse_embedding_request(request))
+    return ORJSONResponse({"embeddings": embeddings})
+
+@app.post("/embeddings/raw", openapi_extra=EMBEDDING_REQUEST_SCHEMA)
+async def generate_raw_embeddings(request: Request):
+    """Generate embeddings as little-endian float16 bytes in row-major order"""
+    embeddings = await embed_request(await parse_embedding_request(request))
+    return Response(
+        content=embeddings.astype("<f2").tobytes(),
+        media_type="application/octet-stream",
+        headers={
+            "X-Embedding-Count": str(embeddings.shape[0]),
+            "X-Embedding-Dimension": str(embeddings.shape[1]),
+            "X-Embedding-Dtype": "float16"
+        }
+    )
+
+async def stream_embeddings(model: SentenceTransformer, model_name: str, sentences: List[str]):
+    """Yield one NDJSON line per embedding, a length-sorted mini-batch at a time"""
+    try:
+        # Tokenizing the whole request would stall the event loop; the lengths
+        # travel with each slice so the encoder does not tokenize it again
+        lengths = await asyncio.to_thread(token_lengths, model, sentences)
+        order = np.argsort(lengths, kind="stable")
+        for start in range(0, len(order), MAX_BATCH_SIZE):
+            indices = order[start:start + MAX_BATCH_SIZE]
+            embeddings = await get_embeddings(
+                model_name, [sentences[i] for i in indices], [lengths[i] for i in indices]
+            )
+            embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+            yield b"".join(
+                orjson.dumps({"index": int(i), "embedding": row}, option=orjson.OPT_SERIALIZE_NUMPY) + b"\n"
+                for i, row in zip(indices, embeddings)
+            )
+    except Exception as e:
+        # Headers are already sent, so report the failure in-band
+        logger.error(f"Error streaming embeddings: {e}")
+        yield orjson.dumps({"error": f"Failed to generate embeddings: {str(e)}"}) + b"\n"
+
+@app.post("/embeddings/stream", openapi_extra=EMBEDDING_REQUEST_SCHEMA)
+async def generate_streamed_embeddings(request: Request):
+    """Stream embeddings as NDJSON lines of {"index", "embedding"}
+
+    Rows are emitted in length-sorted order as each mini-batch finishes, so
+    the encoded output held at once is bounded by MAX_BATCH_SIZE. The request
+    body is still read in full, so requests are capped at STREAM_MAX_SENTENCES.
+    """
+    payload = await parse_embedding_request(request)
+    model_name = validate_request(payload, max_sentences=STREAM_MAX_SENTENCES)
+
+    # Load before the 200 goes out so load failures are real HTTP errors
+    try:
+        model = await get_model(model_name)
+    except Exception as e:
+        logger.error(f"Error loading model {model_name}: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to generate embeddings: {str(e)}")
+
+    logger.info(f"Streaming embeddings for {len(payload.sentences)} sentences")
+    return StreamingResponse(
+        stream_embeddings(model, model_name, payload.sentences),
+        media_type="application/x-ndjson"
+    )
+
 @app.get("/model/info")
 async def model_info():
     """Get model information"""
+    model = MODEL_CACHE.get(DEFAULT_MODEL)
     if model is None:
         raise HTTPException(status_code=503, detail="Model not loaded")
     
     return {
-        "model_name": os.getenv("MODEL_NAME", "all-MiniLM-L6-v2"),
+        "model_name": DEFAULT_MODEL,
         "max_seq_length": getattr(model, 'max_seq_length', 'unknown'),
         "embedding_dimension": model.get_sentence_embedding_dimension(),
-        "device": str(model.device) if hasattr(model, 'device') else 'unknown'
+        "device": str(model.device) if hasattr(model, 'device') else 'unknown',
+        "tokenizer_fast": getattr(model.tokenizer, 'is_fast', False)
     }
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+
+    workers = int(os.getenv("WORKERS", max(1, (os.cpu_count() or 1) // 2)))
+    # Workers inherit this, so each one knows whether it runs alone
+    os.environ["WORKERS"] = str(workers)
+    uvicorn.run(
+        "app:app",
+        host="0.0.0.0",
+        port=8000,
+        workers=workers,
+        loop="uvloop",
+        http="httptools",
+        log_level="warning"
+    )
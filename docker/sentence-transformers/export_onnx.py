@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+Export and optimize a sentence-transformers model to ONNX at image build time
+"""
+
+import os
+import sys
+
+from sentence_transformers import (
+    SentenceTransformer,
+    export_dynamic_quantized_onnx_model,
+    export_optimized_onnx_model,
+)
+
+
+def main():
+    model_name = sys.argv[1] if len(sys.argv) > 1 else os.getenv("MODEL_NAME", "all-MiniLM-L6-v2")
+    output_dir = os.path.join(os.getenv("ONNX_MODEL_DIR", "/app/models"), model_name)
+    level = os.getenv("ONNX_OPTIMIZATION_LEVEL", "O3")
+    quantization = os.getenv("ONNX_QUANTIZATION_CONFIG", "avx512_vnni")
+
+    # Export the plain ONNX graph alongside the sentence-transformers modules
+    model = SentenceTransformer(model_name, backend="onnx")
+    model.save(output_dir)
+
+    # Writes onnx/model_<level>.onnx with fused kernels and constant folding
+    export_optimized_onnx_model(model, level, output_dir)
+
+    # Writes onnx/model_qint8_<config>.onnx with dynamically quantized weights
+    export_dynamic_quantized_onnx_model(model, quantization, output_dir)
+    print(f"Exported {model_name} ({level}, qint8 {quantization}) to {output_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Gunicorn configuration for running the embedding service with multiple workers
+"""
+
+import os
+import shutil
+import subprocess
+
+
+def detect_gpu_count():
+    """Count visible GPUs without initialising CUDA in the master process"""
+    if os.getenv("NUM_GPUS"):
+        return int(os.environ["NUM_GPUS"])
+    if os.getenv("CUDA_VISIBLE_DEVICES") is not None:
+        return len([d for d in os.environ["CUDA_VISIBLE_DEVICES"].split(",") if d.strip()])
+    if shutil.which("nvidia-smi") is None:
+        return 0
+    try:
+        result = subprocess.run(["nvidia-smi", "-L"], capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return 0
+    return len([line for line in result.stdout.splitlines() if line.startswith("GPU")])
+
+
+cpu_count = os.cpu_count() or 1
+gpu_count = detect_gpu_count()
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+worker_class = "uvicorn.workers.UvicornWorker"
+workers = int(os.getenv("WORKERS", min(cpu_count, gpu_count or max(1, cpu_count // 2))))
+# Also bounds worker boot, which loads, exports, warms up and drift-checks the
+# model before the first heartbeat; a cold cache or an unbaked MODEL_NAME
+# needs minutes. Encodes run off the event loop, so this rarely fires later.
+timeout = int(os.getenv("WORKER_TIMEOUT", "600"))
+
+# Workers inherit this; app.py only starts its multi-GPU pool for a single worker
+os.environ["WORKERS"] = str(workers)
+
+# Split the cores between workers; app.py pins torch/BLAS/ONNX threads from this
+os.environ.setdefault("OMP_NUM_THREADS", str(max(1, cpu_count // workers)))
+loglevel = "warning"
+
+# Import the app (and its libraries) once in the master so workers share pages
+preload_app = True
+
+# Loading weights before fork is only safe for torch on CPU: CUDA contexts and
+# ONNX Runtime thread pools do not survive fork, so those load in each worker
+preload_model = (
+    os.getenv("PRELOAD_MODEL", "false").lower() == "true"
+    and os.getenv("MODEL_BACKEND", "onnx") == "torch"
+    and gpu_count == 0
+)
+
+
+def when_ready(server):
+    """Load the model in the master so copy-on-write shares the weights"""
+    if not preload_model:
+        return
+
+    import app
+
+    server.log.info(f"Preloading model before fork: {app.DEFAULT_MODEL}")
+    app.MODEL_CACHE[app.DEFAULT_MODEL] = app.load_model(app.DEFAULT_MODEL)
+
+
+# A single worker keeps every GPU visible so app.py can spread batches across
+# them; with several workers each one is pinned to its own device
+pin_gpus = gpu_count > 0 and workers > 1
+
+
+def pre_fork(server, worker):
+    """Record which GPU slot the next worker should be pinned to"""
+    if pin_gpus:
+        used = {w.gpu_slot for w in server.WORKERS.values() if hasattr(w, "gpu_slot")}
+        free = [slot for slot in range(gpu_count) if slot not in used]
+        worker.gpu_slot = free[0] if free else len(server.WORKERS) % gpu_count
+
+
+def post_fork(server, worker):
+    """Pin each worker to its own CUDA device before the model is loaded"""
+    if pin_gpus:
+        visible = os.getenv("CUDA_VISIBLE_DEVICES")
+        devices = visible.split(",") if visible else [str(i) for i in range(gpu_count)]
+        os.environ["CUDA_VISIBLE_DEVICES"] = devices[worker.gpu_slot].strip()
+        server.log.info(f"Worker {worker.pid} pinned to CUDA device {os.environ['CUDA_VISIBLE_DEVICES']}")
@@ -6,6 +6,7 @@ import (
 	"encoding/json"
 	"fmt"
 	"io"
+	"net"
 	"os"
 
 	"github.com/zetmem/mcp-server/pkg/models"
@@ -76,6 +77,86 @@ func (s *Server) Start(ctx context.Context) error {
 	}
 }
 
+// ServeUnix serves the MCP protocol over a Unix domain socket instead of
+// stdin/stdout, handling one client connection at a time
+func (s *Server) ServeUnix(ctx context.Context, path string) error {
+	// Remove a stale socket left behind by a previous run, but never
+	// anything else that happens to live at the path
+	if info, err := os.Lstat(path); err == nil {
+		if info.Mode()&os.ModeSocket == 0 {
+			return fmt.Errorf("refusing to replace %s: not a socket", path)
+		}
+		if err := os.Remove(path); err != nil {
+			return fmt.Errorf("failed to remove stale socket %s: %w", path, err)
+		}
+	} else if !os.IsNotExist(err) {
+		return fmt.Errorf("failed to stat %s: %w", path, err)
+	}
+
+	listener, err := net.Listen("unix", path)
+	if err != nil {
+		return fmt.Errorf("failed to listen on %s: %w", path, err)
+	}
+	defer listener.Close()
+
+	if err := os.Chmod(path, 0600); err != nil {
+		return fmt.Errorf("failed to restrict socket permissions: %w", err)
+	}
+
+	go func() {
+		<-ctx.Done()
+		listener.Close()
+	}()
+
+	s.logger.Info("Listening on Unix socket", zap.String("path", path))
+
+	for {
+		conn, err := listener.Accept()
+		if err != nil {
+			if ctx.Err() != nil {
+				return ctx.Err()
+			}
+			return fmt.Errorf("failed to accept connection: %w", err)
+		}
+
+		s.logger.Info("Client connected")
+		s.reader = bufio.NewReader(connReader{conn})
+		s.writer = conn
+		s.initialized = false
+
+		// Unblock the pending read if the server shuts down mid-connection
+		done := make(chan struct{})
+		go func() {
+			select {
+			case <-ctx.Done():
+				conn.Close()
+			case <-done:
+			}
+		}()
+
+		err = s.Start(ctx)
+		close(done)
+		conn.Close()
+		if err != nil {
+			return err
+		}
+	}
+}
+
+// connReader reports any read error on a client connection as io.EOF so a
+// reset or closed socket ends the session instead of being retried
+type connReader struct {
+	net.Conn
+}
+
+func (r connReader) Read(p []byte) (int, error) {
+	n, err := r.Conn.Read(p)
+	if err != nil {
+		err = io.EOF
+	}
+	return n, err
+}
+
 // handleRequest handles a single JSON-RPC request or notification
 func (s *Server) handleRequest(ctx context.Context) error {
 	line, err := s.reader.ReadString('\n')
@@ -0,0 +1,152 @@
+package mcp
+
+import (
+	"bufio"
+	"context"
+	"encoding/json"
+	"net"
+	"os"
+	"path/filepath"
+	"testing"
+	"time"
+
+	"github.com/zetmem/mcp-server/pkg/models"
+	"go.uber.org/zap"
+)
+
+const initializeRequest = `{"jsonrpc":"2.0","id":1,"method":"initialize","params":{"protocolVersion":"2024-11-05","capabilities":{},"clientInfo":{"name":"test-client","version":"1.0.0"}}}`
+
+// startUnixServer runs ServeUnix on a temporary socket until the test ends
+func startUnixServer(t *testing.T) string {
+	t.Helper()
+
+	path := filepath.Join(t.TempDir(), "zetmem.sock")
+	server := NewServer(zap.NewNop())
+
+	ctx, cancel := context.WithCancel(context.Background())
+	errCh := make(chan error, 1)
+	go func() {
+		errCh <- server.ServeUnix(ctx, path)
+	}()
+
+	t.Cleanup(func() {
+		cancel()
+		select {
+		case err := <-errCh:
+			if err != nil && err != context.Canceled {
+				t.Errorf("ServeUnix returned unexpected error: %v", err)
+			}
+		case <-time.After(5 * time.Second):
+			t.Error("ServeUnix did not stop after cancel")
+		}
+	})
+
+	return path
+}
+
+// dialUnix connects to the socket, waiting for the server to start listening
+func dialUnix(t *testing.T, path string) net.Conn {
+	t.Helper()
+
+	deadline := time.Now().Add(5 * time.Second)
+	for {
+		conn, err := net.Dial("unix", path)
+		if err == nil {
+			t.Cleanup(func() { conn.Close() })
+			return conn
+		}
+		if time.Now().After(deadline) {
+			t.Fatalf("Failed to connect to %s: %v", path, err)
+		}
+		time.Sleep(10 * time.Millisecond)
+	}
+}
+
+// roundTrip writes one newline-delimited request and reads one response line
+func roundTrip(t *testing.T, conn net.Conn, reader *bufio.Reader, request string) models.MCPResponse {
+	t.Helper()
+
+	conn.SetDeadline(time.Now().Add(5 * time.Second))
+	if _, err := conn.Write([]byte(request + "\n")); err != nil {
+		t.Fatalf("Failed to write request: %v", err)
+	}
+
+	line, err := reader.ReadString('\n')
+	if err != nil {
+		t.Fatalf("Failed to read response: %v", err)
+	}
+
+	var response models.MCPResponse
+	if err := json.Unmarshal([]byte(line), &response); err != nil {
+		t.Fatalf("Failed to parse response %q: %v", line, err)
+	}
+	return response
+}
+
+func TestServeUnixInitialize(t *testing.T) {
+	path := startUnixServer(t)
+	conn := dialUnix(t, path)
+
+	response := roundTrip(t, conn, bufio.NewReader(conn), initializeRequest)
+	if response.Error != nil {
+		t.Fatalf("Expected initialize to succeed, got error: %v", response.Error.Message)
+	}
+
+	result, ok := response.Result.(map[string]interface{})
+	if !ok {
+		t.Fatalf("Expected result object, got %T", response.Result)
+	}
+
+	if result["protocolVersion"] != "2024-11-05" {
+		t.Errorf("Expected protocol version '2024-11-05', got %v", result["protocolVersion"])
+	}
+
+	info, err := os.Stat(path)
+	if err != nil {
+		t.Fatalf("Failed to stat socket: %v", err)
+	}
+
+	if info.Mode().Perm() != 0600 {
+		t.Errorf("Expected socket permissions 0600, got %o", info.Mode().Perm())
+	}
+}
+
+func TestServeUnixReconnect(t *testing.T) {
+	path := startUnixServer(t)
+
+	first := dialUnix(t, path)
+	if response := roundTrip(t, first, bufio.NewReader(first), initializeRequest); response.Error != nil {
+		t.Fatalf("Expected first initialize to succeed, got error: %v", response.Error.Message)
+	}
+	first.Close()
+
+	// A new connection is a new session and must initialize again
+	second := dialUnix(t, path)
+	reader := bufio.NewReader(second)
+
+	response := roundTrip(t, second, reader, `{"jsonrpc":"2.0","id":2,"method":"tools/list","params":{}}`)
+	if response.Error == nil || response.Error.Code != models.InvalidRequest {
+		t.Errorf("Expected tools/list before initialize to fail with InvalidRequest, got %+v", response)
+	}
+
+	if response := roundTrip(t, second, reader, initializeRequest); response.Error != nil {
+		t.Fatalf("Expected initialize after reconnect to succeed, got error: %v", response.Error.Message)
+	}
+}
+
+func TestServeUnixRefusesNonSocket(t *testing.T) {
+	path := filepath.Join(t.TempDir(), "not-a-socket")
+	if err := os.WriteFile(path, []byte("keep me"), 0644); err != nil {
+		t.Fatalf("Failed to create file: %v", err)
+	}
+
+	server := NewServer(zap.NewNop())
+	if err := server.ServeUnix(context.Background(), path); err == nil {
+		t.Fatal("Expected ServeUnix to refuse a path that is not a socket")
+	}
+
+	content, err := os.ReadFile(path)
+	if err != nil || string(content) != "keep me" {
+		t.Errorf("Expected existing file to be left untouched, got %q (%v)", content, err)
+	}
+}
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+JSON-RPC client shared by the ZetMem MCP Server test scripts
+Starts the server binary and talks to it over stdio or a Unix socket
+"""
+
+import asyncio
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+# Largest single JSON-RPC response line accepted from the server
+MAX_LINE_BYTES = 16 * 1024 * 1024
+
+# Server transport: "stdio" (default) or "unix:<socket path>" to talk to the
+# server over a Unix domain socket, e.g. MCP_TRANSPORT=unix:/tmp/zetmem.sock
+MCP_TRANSPORT = os.environ.get('MCP_TRANSPORT', 'stdio')
+
+class MCPClient:
+    """Persistent JSON-RPC client for a single MCP server process
+
+    Requests may be issued concurrently: writes are serialized by a lock and
+    a background reader task dispatches each response by its JSON-RPC id.
+    The server still answers requests one at a time, so a request's timeout
+    also covers every request queued ahead of it.
+    """
+
+    def __init__(self, command: Optional[List[str]] = None, timeout: float = 10,
+                 transport: Optional[str] = None):
+        self.command = command or ['./zetmem-server', '-config', 'config/development.yaml']
+        self.timeout = timeout
+        self.transport = transport or MCP_TRANSPORT
+        self.process = None
+        self.reader = None
+        self.writer = None
+        self.stderr_lines: List[str] = []
+        self.pending: Dict[Any, asyncio.Future] = {}
+
+    async def __aenter__(self):
+        if self.transport.startswith('unix:'):
+            # The server listens on the socket and leaves its stdio unused
+            self.process = await asyncio.create_subprocess_exec(
+                *self.command, '-transport', self.transport,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.PIPE
+            )
+        else:
+            self.process = await asyncio.create_subprocess_exec(
+                *self.command,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                limit=MAX_LINE_BYTES
+            )
+            self.reader, self.writer = self.process.stdout, self.process.stdin
+
+        # Drain stderr so server logging never fills the pipe and blocks it
+        self.stderr_task = asyncio.create_task(self._drain_stderr())
+
+        if self.writer is None:
+            try:
+                self.reader, self.writer = await self._connect_unix(self.transport[len('unix:'):])
+            except BaseException:
+                self.process.kill()
+                await self.process.wait()
+                raise
+
+        self.write_lock = asyncio.Lock()
+        self.reader_task = asyncio.create_task(self._read_responses())
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def _connect_unix(self, path):
+        """Connect to the server's socket, retrying until it is listening"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        while True:
+            try:
+                return await asyncio.open_unix_connection(path, limit=MAX_LINE_BYTES)
+            except (FileNotFoundError, ConnectionRefusedError):
+                if self.process.returncode is not None or loop.time() > deadline:
+                    raise ConnectionError(f"MCP server is not listening on {path}")
+                await asyncio.sleep(0.05)
+
+    async def _drain_stderr(self):
+        async for line in self.process.stderr:
+            self.stderr_lines.append(line.decode(errors='replace'))
+
+    async def _read_responses(self):
+        error = "No response from server"
+        try:
+            # Each response is one line; read them as they arrive
+            while True:
+                line = await self.reader.readline()
+                if not line:
+                    break
+                try:
+                    response = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                future = self.pending.pop(response.get("id"), None)
+                if future is not None and not future.done():
+                    future.set_result(response)
+        except ValueError as e:
+            # Raised when a line exceeds MAX_LINE_BYTES
+            error = f"Invalid response from server: {e}"
+
+        # Server exited or the stream broke; fail anything still waiting
+        for future in self.pending.values():
+            if not future.done():
+                future.set_result({"error": error})
+        self.pending.clear()
+
+    async def close(self):
+        """Close our end so a stdio server exits, then reap the process"""
+        if self.process is None:
+            return
+        self.writer.close()
+        if self.transport.startswith('unix:'):
+            # A socket server keeps listening for the next client
+            self.process.terminate()
+        try:
+            await asyncio.wait_for(self.process.wait(), timeout=5)
+        except asyncio.TimeoutError:
+            self.process.kill()
+            await self.process.wait()
+        await asyncio.gather(self.reader_task, self.stderr_task, return_exceptions=True)
+        self.process = None
+
+    async def _write(self, message: Dict[str, Any]):
+        async with self.write_lock:
+            self.writer.write((json.dumps(message) + '\n').encode())
+            await self.writer.drain()
+
+    async def send(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Send a JSON-RPC request and await the response with the same id"""
+        if self.reader_task.done():
+            return {"error": "No response from server"}
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request["id"]] = future
+        try:
+            await self._write(request)
+            return await asyncio.wait_for(future, timeout=self.timeout)
+        except asyncio.TimeoutError:
+            print(f"Server stderr: {''.join(self.stderr_lines[-20:])}")
+            return {"error": "Request timeout"}
+        except Exception as e:
+            return {"error": str(e)}
+        finally:
+            self.pending.pop(request["id"], None)
+
+    async def notify(self, method: str, params: Optional[Dict[str, Any]] = None):
+        """Send a JSON-RPC notification, which gets no response"""
+        await self._write({"jsonrpc": "2.0", "method": method, "params": params or {}})
+
+    async def initialize(self, client_name: str = "zetmem-test-client") -> Dict[str, Any]:
+        """Perform the MCP initialize handshake required before tool calls"""
+        response = await self.send({
+            "jsonrpc": "2.0",
+            "id": "initialize",
+            "method": "initialize",
+            "params": {
+                "protocolVersion": "2024-11-05",
+                "capabilities": {},
+                "clientInfo": {"name": client_name, "version": "1.0.0"}
+            }
+        })
+        await self.notify("notifications/initialized")
+        return response
@@ -4,43 +4,14 @@ Simple test script for ZetMem MCP Server
 Tests the JSON-RPC interface by sending sample requests
 """
 
+import asyncio
 import json
 import subprocess
 import sys
-import time
 
-def send_mcp_request(request):
-    """Send a JSON-RPC request to the MCP server via stdin/stdout"""
-    try:
-        # Start the server process
-        process = subprocess.Popen(
-            ['./zetmem-server', '-config', 'config/development.yaml'],
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
-        )
-        
-        # Send request
-        request_json = json.dumps(request) + '\n'
-        stdout, stderr = process.communicate(input=request_json, timeout=10)
-        
-        if stderr:
-            print(f"Server stderr: {stderr}")
-        
-        # Parse response
-        if stdout.strip():
-            return json.loads(stdout.strip())
-        else:
-            return {"error": "No response from server"}
-            
-    except subprocess.TimeoutExpired:
-        process.kill()
-        return {"error": "Request timeout"}
-    except Exception as e:
-        return {"error": str(e)}
+from mcp_client import MCPClient
 
-def test_initialize():
+async def test_initialize(client):
     """Test MCP initialize"""
     print("Testing MCP initialize...")
     
@@ -58,11 +29,12 @@ def test_initialize():
         }
     }
     
-    response = send_mcp_request(request)
+    response = await client.send(request)
     print(f"Initialize response: {json.dumps(response, indent=2)}")
+    await client.notify("notifications/initialized")
     return response.get("result") is not None
 
-def test_list_tools():
+async def test_list_tools(client):
     """Test listing available tools"""
     print("\nTesting list tools...")
     
@@ -73,7 +45,7 @@ def test_list_tools():
         "params": {}
     }
     
-    response = send_mcp_request(request)
+    response = await client.send(request)
     print(f"List tools response: {json.dumps(response, indent=2)}")
     
     if "result" in response and "tools" in response["result"]:
@@ -85,7 +57,7 @@ def test_list_tools():
     
     return False
 
-def test_store_memory():
+async def test_store_memory(client):
     """Test storing a memory"""
     print("\nTesting store memory...")
     
@@ -104,12 +76,12 @@ def test_store_memory():
         }
     }
     
-    response = send_mcp_request(request)
+    response = await client.send(request)
     print(f"Store memory response: {json.dumps(response, indent=2)}")
     
     return "result" in response and not response.get("error")
 
-def test_retrieve_memory():
+async def test_retrieve_memory(client):
     """Test retrieving memories"""
     print("\nTesting retrieve memory...")
     
@@ -127,12 +99,12 @@ def test_retrieve_memory():
         }
     }
     
-    response = send_mcp_request(request)
+    response = await client.send(request)
     print(f"Retrieve memory response: {json.dumps(response, indent=2)}")
     
     return "result" in response and not response.get("error")
 
-def test_evolve_network():
+async def test_evolve_network(client):
     """Test memory network evolution"""
     print("\nTesting evolve network...")
     
@@ -150,11 +122,30 @@ def test_evolve_network():
         }
     }
     
-    response = send_mcp_request(request)
+    response = await client.send(request)
     print(f"Evolve network response: {json.dumps(response, indent=2)}")
     
     return "result" in response and not response.get("error")
 
+async def run_test(test_name, test_func, client):
+    """Run one test and report whether it passed"""
+    try:
+        if await test_func(client):
+            print(f"✅ {test_name} - PASSED")
+            return True
+        print(f"❌ {test_name} - FAILED")
+    except Exception as e:
+        print(f"❌ {test_name} - ERROR: {e}")
+    return False
+
+async def run_tests(tests):
+    """Run the tests against one shared server and return the pass count"""
+    async with MCPClient() as client:
+        # The server handles requests one at a time, so send them in order;
+        # concurrent calls would each spend their timeout in its queue
+        results = [await run_test(name, func, client) for name, func in tests]
+    return sum(results)
+
 def main():
     """Run all tests"""
     print("ZetMem MCP Server Test Suite")
@@ -176,19 +167,9 @@ def main():
         ("Evolve Network", test_evolve_network),
     ]
     
-    passed = 0
+    passed = asyncio.run(run_tests(tests))
     total = len(tests)
     
-    for test_name, test_func in tests:
-        try:
-            if test_func():
-                print(f"✅ {test_name} - PASSED")
-                passed += 1
-            else:
-                print(f"❌ {test_name} - FAILED")
-        except Exception as e:
-            print(f"❌ {test_name} - ERROR: {e}")
-    
     print("\n" + "=" * 40)
     print(f"Test Results: {passed}/{total} passed")
     
@@ -4,45 +4,19 @@ Comprehensive test script for ZetMem MCP Server Phase 2 features
 Tests advanced capabilities including evolution, monitoring, and enhanced embeddings
 """
 
+import asyncio
 import json
+import re
 import subprocess
 import sys
-import time
-import requests
-from typing import Dict, Any
+import httpx
 
-def send_mcp_request(request: Dict[str, Any]) -> Dict[str, Any]:
-    """Send a JSON-RPC request to the MCP server via stdin/stdout"""
-    try:
-        # Start the server process
-        process = subprocess.Popen(
-            ['./zetmem-server', '-config', 'config/development.yaml'],
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
-        )
-        
-        # Send request
-        request_json = json.dumps(request) + '\n'
-        stdout, stderr = process.communicate(input=request_json, timeout=15)
-        
-        if stderr:
-            print(f"Server stderr: {stderr}")
-        
-        # Parse response
-        if stdout.strip():
-            return json.loads(stdout.strip())
-        else:
-            return {"error": "No response from server"}
-            
-    except subprocess.TimeoutExpired:
-        process.kill()
-        return {"error": "Request timeout"}
-    except Exception as e:
-        return {"error": str(e)}
+from mcp_client import MCPClient
 
-def test_enhanced_memory_storage():
+# Keep-alive client for the metrics/health HTTP server, shared by all tests
+CLIENT = httpx.Client(base_url="http://localhost:9090", timeout=5.0)
+
+async def test_enhanced_memory_storage(client: MCPClient):
     """Test enhanced memory storage with better analysis"""
     print("Testing enhanced memory storage...")
     
@@ -77,7 +51,7 @@ async function processUserData(users) {
         }
     }
     
-    response = send_mcp_request(request)
+    response = await client.send(request)
     print(f"Enhanced storage response: {json.dumps(response, indent=2)}")
     
     success = "result" in response and not response.get("error")
@@ -88,7 +62,7 @@ async function processUserData(users) {
     
     return success
 
-def test_advanced_memory_evolution():
+async def test_advanced_memory_evolution(client: MCPClient):
     """Test the advanced memory evolution system"""
     print("\nTesting advanced memory evolution...")
     
@@ -119,10 +93,10 @@ def test_advanced_memory_evolution():
                 "arguments": memory
             }
         }
-        send_mcp_request(request)
+        await client.send(request)
     
     # Wait a moment for storage
-    time.sleep(1)
+    await asyncio.sleep(1)
     
     # Now test evolution
     request = {
@@ -140,7 +114,7 @@ def test_advanced_memory_evolution():
         }
     }
     
-    response = send_mcp_request(request)
+    response = await client.send(request)
     print(f"Evolution response: {json.dumps(response, indent=2)}")
     
     success = "result" in response and not response.get("error")
@@ -151,7 +125,7 @@ def test_advanced_memory_evolution():
     
     return success
 
-def test_enhanced_memory_retrieval():
+async def test_enhanced_memory_retrieval(client: MCPClient):
     """Test enhanced memory retrieval with better relevance"""
     print("\nTesting enhanced memory retrieval...")
     
@@ -170,7 +144,7 @@ def test_enhanced_memory_retrieval():
         }
     }
     
-    response = send_mcp_request(request)
+    response = await client.send(request)
     print(f"Enhanced retrieval response: {json.dumps(response, indent=2)}")
     
     success = "result" in response and not response.get("error")
@@ -181,47 +155,45 @@ def test_enhanced_memory_retrieval():
     
     return success
 
-def test_metrics_endpoint():
+def test_metrics_endpoint(client: MCPClient):
     """Test Prometheus metrics endpoint"""
     print("\nTesting metrics endpoint...")
     
     try:
-        # Start server in background for metrics test
-        process = subprocess.Popen(
-            ['./zetmem-server', '-config', 'config/development.yaml'],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
-        )
-        
-        # Wait for server to start
-        time.sleep(3)
-        
-        # Test metrics endpoint
-        response = requests.get('http://localhost:9090/metrics', timeout=5)
-        
-        if response.status_code == 200:
-            metrics_content = response.text
-            print(f"Metrics endpoint accessible, content length: {len(metrics_content)}")
-            
-            # Check for expected metrics
-            expected_metrics = [
-                'zetmem_memory_operations_total',
-                'zetmem_llm_requests_total',
-                'zetmem_vector_searches_total'
-            ]
-            
-            found_metrics = sum(1 for metric in expected_metrics if metric in metrics_content)
-            print(f"Found {found_metrics}/{len(expected_metrics)} expected metrics")
-            
-            success = found_metrics >= 2  # At least some metrics should be present
-        else:
-            print(f"Metrics endpoint returned status: {response.status_code}")
-            success = False
-        
-        # Clean up
-        process.terminate()
-        process.wait(timeout=5)
-        
+        # The shared server started by main() also serves the metrics port
+        with CLIENT.stream("GET", "/metrics") as response:
+            if response.status_code == 200:
+                # Check for expected metrics
+                expected_metrics = [
+                    'zetmem_memory_operations_total',
+                    'zetmem_llm_requests_total',
+                    'zetmem_vector_searches_total'
+                ]
+                pattern = re.compile("|".join(map(re.escape, expected_metrics)).encode())
+                overlap = max(map(len, expected_metrics)) - 1
+
+                # Scan the body once, keeping a short tail so names split across
+                # chunks still match; once every metric is seen, keep reading
+                # without scanning so the connection goes back to the pool
+                found = set()
+                body_bytes = 0
+                tail = b""
+                for chunk in response.iter_bytes():
+                    body_bytes += len(chunk)
+                    if len(found) < len(expected_metrics):
+                        window = tail + chunk
+                        found.update(match.decode() for match in pattern.findall(window))
+                        tail = window[-overlap:]
+
+                print(f"Metrics endpoint accessible, read {body_bytes} bytes")
+                found_metrics = len(found)
+                print(f"Found {found_metrics}/{len(expected_metrics)} expected metrics")
+                
+                success = found_metrics >= 2  # At least some metrics should be present
+            else:
+                print(f"Metrics endpoint returned status: {response.status_code}")
+                success = False
+
     except Exception as e:
         print(f"Metrics test error: {e}")
         success = False
@@ -233,23 +205,13 @@ def test_metrics_endpoint():
     
     return success
 
-def test_health_endpoint():
+def test_health_endpoint(client: MCPClient):
     """Test health check endpoint"""
     print("\nTesting health endpoint...")
     
     try:
-        # Start server in background
-        process = subprocess.Popen(
-            ['./zetmem-server', '-config', 'config/development.yaml'],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
-        )
-        
-        # Wait for server to start
-        time.sleep(3)
-        
         # Test health endpoint
-        response = requests.get('http://localhost:9090/health', timeout=5)
+        response = CLIENT.get("/health")
         
         if response.status_code == 200:
             print("Health endpoint accessible")
@@ -257,11 +219,7 @@ def test_health_endpoint():
         else:
             print(f"Health endpoint returned status: {response.status_code}")
             success = False
-        
-        # Clean up
-        process.terminate()
-        process.wait(timeout=5)
-        
+
     except Exception as e:
         print(f"Health test error: {e}")
         success = False
@@ -273,7 +231,7 @@ def test_health_endpoint():
     
     return success
 
-def test_docker_services():
+def test_docker_services(client: MCPClient):
     """Test Docker services are configured correctly"""
     print("\nTesting Docker services configuration...")
     
@@ -318,6 +276,27 @@ def test_docker_services():
     
     return success
 
+async def run_test(test_name: str, test_func, client: MCPClient) -> bool:
+    """Run one test; blocking checks run in a thread so server output keeps draining"""
+    try:
+        if asyncio.iscoroutinefunction(test_func):
+            return bool(await test_func(client))
+        return bool(await asyncio.to_thread(test_func, client))
+    except Exception as e:
+        print(f"❌ {test_name} - ERROR: {e}")
+        return False
+
+async def run_tests(tests) -> int:
+    """Run all tests in order against one shared server"""
+    # One server process serves every test, including the HTTP endpoints
+    async with MCPClient(timeout=15) as client:
+        await client.initialize("phase2-test-client")
+
+        # The server handles tool calls one at a time, and the metrics check
+        # needs the counters the tool tests create, so tests run in order
+        results = [await run_test(name, func, client) for name, func in tests]
+    return sum(results)
+
 def main():
     """Run all Phase 2 tests"""
     print("🚀 ZetMem MCP Server Phase 2 Test Suite")
@@ -341,17 +320,12 @@ def main():
         ("Docker Services Config", test_docker_services),
     ]
 
-    passed = 0
+    try:
+        passed = asyncio.run(run_tests(tests))
+    finally:
+        CLIENT.close()
     total = len(tests)
 
-    for test_name, test_func in tests:
-        try:
-            if test_func():
-                passed += 1
-            time.sleep(1)  # Brief pause between tests
-        except Exception as e:
-            print(f"❌ {test_name} - ERROR: {e}")
-
     print("\n" + "=" * 50)
     print(f"Phase 2 Test Results: {passed}/{total} passed")
 